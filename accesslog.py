@@ -0,0 +1,100 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class AccessLog:
+    """Structured access log written by a background thread.
+
+    record() only appends a tuple to a bounded buffer; formatting and file
+    I/O happen on the writer thread, which drains the buffer in batches of up
+    to `batch_size` records per write. When the buffer is full new records
+    are dropped and counted instead of blocking the request.
+
+    The file is opened in the constructor, so an unwritable path raises
+    OSError to the caller instead of killing the writer thread silently.
+    """
+
+    def __init__(self, path, capacity=8192, batch_size=512, flush_interval=0.5):
+
+        self.path = path
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = deque()
+        self.dropped = 0
+        self.dropped_lock = threading.Lock()  # record() runs on many request threads
+        self.written = 0
+        self.file = open(path, "a", buffering=1 << 16)
+        self.wakeup = threading.Event()
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def record(self, routing_key, server, attempts, upstream_latency, status):
+        """Queue one access record. Never blocks; drops the record if the buffer is full"""
+        if len(self.buffer) >= self.capacity:
+            with self.dropped_lock:
+                self.dropped += 1
+            return
+        self.buffer.append((time.time(), routing_key, server, attempts, upstream_latency, status))
+        if len(self.buffer) >= self.batch_size:
+            self.wakeup.set()
+
+    def _format(self, entry):
+
+        ts, routing_key, server, attempts, upstream_latency, status = entry
+        return json.dumps(
+            {
+                "ts": round(ts, 6),
+                "key": routing_key,
+                "server": server,
+                "attempts": attempts,
+                "upstream_ms": None if upstream_latency is None else round(upstream_latency * 1000, 3),
+                "status": status,
+            },
+            separators=(",", ":"),
+        )
+
+    def _drain(self):
+
+        while self.buffer:
+            lines = []
+            while self.buffer and len(lines) < self.batch_size:
+                lines.append(self._format(self.buffer.popleft()))
+            try:
+                self.file.write("\n".join(lines) + "\n")
+            except OSError as e:
+                # Keep the writer alive (e.g. through a full disk); the batch is lost
+                logger.error("Failed to write %s access records to %s: %s", len(lines), self.path, e)
+                with self.dropped_lock:
+                    self.dropped += len(lines)
+                continue
+            self.written += len(lines)
+        try:
+            self.file.flush()
+        except OSError as e:
+            logger.error("Failed to flush %s: %s", self.path, e)
+
+    def _run(self):
+
+        while not self.closed:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self._drain()
+        self._drain()
+        self.file.close()
+
+    def close(self):
+        """Flush what is buffered and stop the writer thread"""
+        self.closed = True
+        self.wakeup.set()
+        self.thread.join(timeout=5)
+
+    def get_stats(self):
+
+        return {"buffered": len(self.buffer), "written": self.written, "dropped": self.dropped}
@@ -1,20 +1,175 @@
-from flask import Flask, jsonify, request
+from flask import Flask, g, jsonify, request
 import requests
 import random
 import logging
-from hash import ConsistentHash
+import logging.handlers
+import atexit
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from hash import HASH_ENGINES
+from snapshot import SnapshotError, load_snapshot, save_snapshot
+from weighting import LatencyWeighter
+from autoscaler import Autoscaler, RequestMetrics
+from supervisor import ServerSupervisor
+from hotkeys import HotKeyDetector
+from accesslog import AccessLog
 
 app = Flask(__name__)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging: records are handed to a queue and written by a
+# background listener thread, so request threads never wait on stderr
+log_queue = queue.SimpleQueue()
+log_handler = logging.StreamHandler()  # QueueHandler already applied BASIC_FORMAT
+logging.basicConfig(level=logging.INFO, handlers=[logging.handlers.QueueHandler(log_queue)])
+log_listener = logging.handlers.QueueListener(log_queue, log_handler)
+log_listener.start()
 logger = logging.getLogger(__name__)
 
 # Server configuration
 HSLOTS = 512
 K = 9
-servers = ["Server_1:5001", "Server_2:5002", "Server_3:5003"]  # Updated ports
-hash_ring = ConsistentHash(num_servers=3, total_slots=HSLOTS)
+DEFAULT_SERVERS = ["Server_1:5001", "Server_2:5002", "Server_3:5003"]  # Updated ports
+# Lookup engine: "ring" (slot ring), "maglev" (lookup table) or "jump" (jump hash)
+HASH_ENGINE = os.getenv("HASH_ENGINE", "ring")
+# Membership and ring state are persisted here on every change
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "ring_snapshot.bin")
+
+
+def new_hash_ring(num_servers):
+    if HASH_ENGINE == "ring":
+        return HASH_ENGINES["ring"](num_servers=num_servers, total_slots=HSLOTS)
+    return HASH_ENGINES[HASH_ENGINE](num_servers=num_servers)
+
+
+def restore_state():
+    """Restore servers, hash ring and latency weights from the snapshot,
+    falling back to the defaults"""
+    if os.path.exists(SNAPSHOT_PATH):
+        try:
+            engine_name, restored_servers, restored_ring, weights = load_snapshot(SNAPSHOT_PATH)
+            if engine_name == HASH_ENGINE:
+                logger.info("Restored %s servers from %s", len(restored_servers), SNAPSHOT_PATH)
+                return restored_servers, restored_ring, weights
+            # Engine changed since the snapshot: keep membership, rebuild routing
+            logger.warning("Snapshot engine %s != %s, rebuilding ring", engine_name, HASH_ENGINE)
+            restored_ring = new_hash_ring(0)
+            for server in restored_servers:
+                restored_ring._add_server(server.split(":")[0])
+            weights = {
+                name: weight for name, weight in weights.items()
+                if restored_ring.set_weight(name, weight)
+            }
+            return restored_servers, restored_ring, weights
+        except SnapshotError as e:
+            logger.error("Ignoring snapshot: %s", e)
+    return list(DEFAULT_SERVERS), new_hash_ring(len(DEFAULT_SERVERS)), {}
+
+
+def persist_state():
+    """Save the current membership and ring so a restart routes identically"""
+    try:
+        save_snapshot(SNAPSHOT_PATH, HASH_ENGINE, servers, hash_ring)
+    except (OSError, SnapshotError) as e:
+        logger.error("Failed to save snapshot: %s", e)
+
+
+servers, hash_ring, restored_weights = restore_state()
+# Serializes changes to servers / hash_ring and snapshot writes from /add,
+# /rm, the autoscaler and the reweighting loop
+membership_lock = threading.Lock()
+
+# Number of distinct ring owners a key's traffic is spread over (and fails over to)
+REPLICAS = int(os.getenv("REPLICAS", 1))
+# One structured record per routed request, written off the request thread
+ACCESS_LOG_PATH = os.getenv("ACCESS_LOG_PATH", "access.log")
+access_log = AccessLog(ACCESS_LOG_PATH) if ACCESS_LOG_PATH else None
+if access_log:
+    atexit.register(access_log.close)
+atexit.register(log_listener.stop)
+
+# Hot keys (by ?key=) are spread over up to HOT_KEY_MAX_SPREAD ring successors
+hot_keys = HotKeyDetector(max_spread=int(os.getenv("HOT_KEY_MAX_SPREAD", 4)))
+
+# Latency-aware weighting: EWMA of forwarded-request latency per backend
+REWEIGHT_INTERVAL = float(os.getenv("REWEIGHT_INTERVAL", 5.0))
+latency_weighter = LatencyWeighter(interval=REWEIGHT_INTERVAL)
+# Continue from the persisted weights so hysteresis compares against what the ring uses
+latency_weighter.weights.update(restored_weights)
+
+
+def reweight_loop():
+    """Periodically shift ring share away from slow backends"""
+    while True:
+        time.sleep(REWEIGHT_INTERVAL)
+        try:
+            with membership_lock:
+                changed = latency_weighter.rebalance(hash_ring)
+                if changed:
+                    persist_state()
+            if changed:
+                logger.info("Reweighted servers: %s", changed)
+        except Exception as e:
+            logger.error("Error in reweight_loop: %s", e)
+
+
+# Jump hash buckets are equal-sized, so only the ring and Maglev are reweighted
+# (see benchmark_weighting.py)
+if hash_ring.SUPPORTS_WEIGHTS:
+    threading.Thread(target=reweight_loop, daemon=True).start()
+
+# Local supervisor: SUPERVISE=1 runs a server/server.py process per server
+# entry, AUTOSCALE=1 additionally grows/shrinks the pool from measured load
+SUPERVISE = os.getenv("SUPERVISE", "0") == "1"
+AUTOSCALE = os.getenv("AUTOSCALE", "0") == "1"
+AUTOSCALE_INTERVAL = float(os.getenv("AUTOSCALE_INTERVAL", 1.0))
+supervisor = ServerSupervisor() if SUPERVISE else None
+if AUTOSCALE and not SUPERVISE:
+    # The autoscale loop only runs under the supervisor, which starts the backends
+    logger.error("AUTOSCALE=1 requires SUPERVISE=1; autoscaling is disabled")
+request_metrics = RequestMetrics()
+autoscaler = Autoscaler(
+    request_metrics,
+    scale_out=lambda n: len(add_server_entries(generate_servers(n))),
+    # Scale in from the newest servers so the original pool stays put
+    scale_in=lambda n: len(remove_server_entries(servers[-n:])),
+    pool_size=lambda: len(servers),
+    min_servers=int(os.getenv("AUTOSCALE_MIN", 2)),
+    max_servers=int(os.getenv("AUTOSCALE_MAX", 6)),
+)
+
+
+def autoscale_loop():
+    """Respawn crashed backends and apply autoscaler decisions"""
+    while True:
+        time.sleep(AUTOSCALE_INTERVAL)
+        try:
+            # Hold the membership lock so a concurrent /rm cannot reap a server
+            # between respawn_dead noticing it died and starting it again
+            with membership_lock:
+                restarted = supervisor.respawn_dead()
+            if restarted:
+                logger.warning("Respawned servers: %s", restarted)
+            if AUTOSCALE:
+                changed = autoscaler.tick()
+                if changed:
+                    logger.info("Autoscaled by %+d: N=%s", changed, len(servers))
+        except Exception as e:
+            logger.error("Error in autoscale_loop: %s", e)
+
+
+def start_supervisor():
+    """Spawn backends for the restored pool and start the autoscale loop"""
+    for server in list(servers):
+        if not supervisor.spawn(server):
+            logger.error("Failed to start server: %s", server)
+    atexit.register(supervisor.reap_all)
+    # Exit normally on SIGTERM so atexit reaps the backends
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    threading.Thread(target=autoscale_loop, daemon=True).start()
 
 
 @app.route("/")
@@ -28,7 +183,8 @@ def root():
                     "/add": "POST - Add servers",
                     "/rm": "DELETE - Remove servers",
                     "/servers": "GET - List all active servers with health status",
-                    "/home": "GET - Route to servers",
+                    "/hotkeys": "GET - Top hot routing keys and their spread factor",
+                    "/home": "GET - Route to servers (?key= for key affinity)",
                 },
             }
         ),
@@ -52,11 +208,76 @@ def get_replicas():
     )
 
 
+def generate_servers(n):
+    """Generate n new server entries with unique ports starting from 5010"""
+    new_servers = []
+    base_port = 5010
+    existing_ports = [int(s.split(":")[1]) for s in servers]
+    for i in range(n):
+        while base_port in existing_ports:
+            base_port += 1
+        new_servers.append(f"Server_{random.randint(100, 999)}:{base_port}")
+        existing_ports.append(base_port)
+        base_port += 1
+    return new_servers
+
+
+def add_server_entries(new_servers):
+    """Adds servers to both the servers list and hash ring. Returns the servers added"""
+    added = []
+    with membership_lock:
+        for server in new_servers:
+            server_name = server.split(":")[0]
+            if server_name in [s.split(":")[0] for s in servers]:
+                continue
+            # Start the backend first so the ring never routes to a dead port
+            if supervisor and not supervisor.spawn(server):
+                logger.error("Failed to start server: %s", server)
+                continue
+            # Add to hash ring
+            if hash_ring._add_server(server_name):
+                servers.append(server)
+                added.append(server)
+                logger.info("Added server: %s", server)
+            else:
+                logger.error("Failed to add server to hash ring: %s", server)
+                if supervisor:
+                    supervisor.reap(server)
+        # A no-op /add must not rewrite (and fsync) the snapshot
+        if added:
+            persist_state()
+    return added
+
+
+def remove_server_entries(remove_list):
+    """Removes servers from both the servers list and hash ring. Returns the servers removed"""
+    successfully_removed = []
+    with membership_lock:
+        for server in remove_list:
+            server_name = server.split(":")[0]
+            if server not in servers:
+                logger.warning("Server not found in active list: %s", server)
+                continue
+            # Remove from hash ring first
+            if hash_ring.remove_server(server_name):
+                servers.remove(server)
+                latency_weighter.forget(server_name)
+                successfully_removed.append(server)
+                logger.info("Removed server: %s", server)
+                if supervisor:
+                    supervisor.reap(server)
+            else:
+                logger.error("Failed to remove server from hash ring: %s", server)
+        if successfully_removed:
+            persist_state()
+    return successfully_removed
+
+
 @app.route("/add", methods=["POST"])
 def add_servers():
     try:
         data = request.get_json()
-        logger.info(f"Add request with data: {data}")
+        logger.info("Add request with data: %s", data)
 
         if not data:
             return (
@@ -81,30 +302,8 @@ def add_servers():
             )
 
         # Generate server names with appropriate ports
-        new_servers = []
-        if hostnames:
-            new_servers = hostnames[:n]
-        else:
-            # Generate new servers with unique ports starting from 5010
-            base_port = 5010
-            existing_ports = [int(s.split(":")[1]) for s in servers]
-            for i in range(n):
-                while base_port in existing_ports:
-                    base_port += 1
-                new_servers.append(f"Server_{random.randint(100, 999)}:{base_port}")
-                existing_ports.append(base_port)
-                base_port += 1
-
-        # Adds servers to both the servers list and hash ring
-        for server in new_servers:
-            server_name = server.split(":")[0]
-            if server_name not in [s.split(":")[0] for s in servers]:
-                # Add to hash ring
-                if hash_ring._add_server(server_name):
-                    servers.append(server)
-                    logger.info(f"Added server: {server}")
-                else:
-                    logger.error(f"Failed to add server to hash ring: {server}")
+        new_servers = hostnames[:n] if hostnames else generate_servers(n)
+        add_server_entries(new_servers)
 
         return (
             jsonify(
@@ -120,7 +319,7 @@ def add_servers():
         )
 
     except Exception as e:
-        logger.error(f"Error in add_servers: {str(e)}")
+        logger.error("Error in add_servers: %s", e)
         return jsonify({"message": f"Error: {str(e)}", "status": "failure"}), 500
 
 
@@ -128,7 +327,7 @@ def add_servers():
 def remove_servers():
     try:
         data = request.get_json()
-        logger.info(f"Remove request with data: {data}")
+        logger.info("Remove request with data: %s", data)
 
         if not data:
             return (
@@ -155,20 +354,7 @@ def remove_servers():
         # Determine which servers to remove
         remove_list = hostnames[:n] if hostnames else servers[:n]
 
-        # Removes servers from both the servers list and hash ring
-        successfully_removed = []
-        for server in remove_list:
-            server_name = server.split(":")[0]
-            if server in servers:
-                # Remove from hash ring first
-                if hash_ring.remove_server(server_name):
-                    servers.remove(server)
-                    successfully_removed.append(server)
-                    logger.info(f"Removed server: {server}")
-                else:
-                    logger.error(f"Failed to remove server from hash ring: {server}")
-            else:
-                logger.warning(f"Server not found in active list: {server}")
+        remove_server_entries(remove_list)
 
         return (
             jsonify(
@@ -184,7 +370,7 @@ def remove_servers():
         )
 
     except Exception as e:
-        logger.error(f"Error in remove_servers: {str(e)}")
+        logger.error("Error in remove_servers: %s", e)
         return jsonify({"message": f"Error: {str(e)}", "status": "failure"}), 500
 
 
@@ -196,20 +382,30 @@ def is_server_alive(server):
         response = requests.get(url, timeout=2)
         return response.status_code == 200
     except (requests.RequestException, IndexError) as e:
-        logger.error(f"Health check failed for {server}: {str(e)}")
+        logger.error("Health check failed for %s: %s", server, e)
         return False
 
 
 @app.route("/home", methods=["GET"])
 def route_home():
     try:
-        # Generate a random request ID
-        request_id = random.randint(100000, 999999)
+        # Route by the client's key when given (key affinity), else a random request ID
+        routing_key = request.args.get("key")
+        spread = 1
+        if routing_key is None:
+            routing_key = random.randint(100000, 999999)
+        else:
+            spread = hot_keys.record(routing_key, len(servers))
+        g.routing_key = routing_key
+        g.server = None
+        g.attempts = 0
+        g.upstream_latency = None
 
-        # Get server from hash ring
-        server_name = hash_ring.get_server_for_request(request_id)
+        # Replica set for this key: traffic is spread over the first REPLICAS
+        # ring owners (more for hot keys) and fails over when a replica is down
+        candidates = hash_ring.get_servers(routing_key, max(REPLICAS, spread))
 
-        if not server_name:
+        if not candidates:
             return (
                 jsonify(
                     {"message": "Error: No servers available", "status": "failure"}
@@ -217,26 +413,28 @@ def route_home():
                 500,
             )
 
-        # Find the matching server with port
-        server = next((s for s in servers if s.startswith(server_name)), None)
+        # Start at a replica picked in proportion to its latency weight
+        weights = getattr(hash_ring, "weights", {})
+        first = 0
+        if len(candidates) > 1:
+            first = random.choices(
+                range(len(candidates)), [weights.get(c, 1.0) for c in candidates]
+            )[0]
+        server = None
+        for server_name in candidates[first:] + candidates[:first]:
+            # Find the matching server with port
+            entry = next((s for s in servers if s.split(":")[0] == server_name), None)
+            g.attempts += 1
+            # Check if server is alive
+            if entry and is_server_alive(entry):
+                server = entry
+                break
 
         if not server:
             return (
                 jsonify(
                     {
-                        "message": "Error: Server not found in active list",
-                        "status": "failure",
-                    }
-                ),
-                500,
-            )
-
-        # Check if server is alive
-        if not is_server_alive(server):
-            return (
-                jsonify(
-                    {
-                        "message": f"Error: Server {server} is not responding",
+                        "message": f"Error: No replica of {candidates} is responding",
                         "status": "failure",
                     }
                 ),
@@ -245,26 +443,68 @@ def route_home():
 
         # Forward request to selected server
         port = server.split(":")[1]
-        response = requests.get(f"http://localhost:{port}/home", timeout=2)
+        g.server = server
+        start = time.perf_counter()
+        request_metrics.begin()
+        try:
+            response = requests.get(f"http://localhost:{port}/home", timeout=2)
+        finally:
+            # Timeouts count too, otherwise a stalled backend would look healthy
+            latency = time.perf_counter() - start
+            g.upstream_latency = latency
+            request_metrics.end(latency)
+            if hash_ring.SUPPORTS_WEIGHTS:
+                latency_weighter.observe(server_name, latency)
         return jsonify(response.json()), response.status_code
 
     except requests.RequestException as e:
-        logger.error(f"Request forwarding failed: {str(e)}")
+        logger.error("Request forwarding failed: %s", e)
         return (
             jsonify({"message": f"Error: Failed to reach server", "status": "failure"}),
             502,
         )
     except Exception as e:
-        logger.error(f"Error in route_home: {str(e)}")
+        logger.error("Error in route_home: %s", e)
         return jsonify({"message": f"Error: {str(e)}", "status": "failure"}), 500
 
 
+@app.after_request
+def record_access(response):
+    """Queue an access record for routed requests; the write happens on the log thread"""
+    if access_log and "routing_key" in g:
+        access_log.record(
+            g.routing_key, g.server, g.attempts, g.upstream_latency, response.status_code
+        )
+    return response
+
+
 @app.route("/heartbeat", methods=["GET"])
 def heartbeat():
     """Health check endpoint for the load balancer itself"""
     return jsonify({"status": "alive"}), 200
 
 
+@app.route("/hotkeys", methods=["GET"])
+def list_hot_keys():
+    """List the hottest routing keys and how many replicas each is spread over"""
+    try:
+        k = request.args.get("k", 10, type=int)
+        return (
+            jsonify(
+                {
+                    "message": {
+                        "hot_keys": hot_keys.get_stats(k),
+                        "status": "successful",
+                    }
+                }
+            ),
+            200,
+        )
+    except Exception as e:
+        logger.error("Error in list_hot_keys: %s", e)
+        return jsonify({"message": f"Error: {str(e)}", "status": "failure"}), 500
+
+
 @app.route("/servers", methods=["GET"])
 def list_servers():
     """List all active servers"""
@@ -286,6 +526,9 @@ def list_servers():
                         "server_health": server_health,
                         "hash_ring_distribution": distribution,
                         "total_virtual_servers": sum(distribution.values()),
+                        "latency_weights": latency_weighter.get_stats(),
+                        "load": request_metrics.get_stats(),
+                        "access_log": access_log.get_stats() if access_log else None,
                         "status": "successful",
                     }
                 }
@@ -293,9 +536,12 @@ def list_servers():
             200,
         )
     except Exception as e:
-        logger.error(f"Error in list_servers: {str(e)}")
+        logger.error("Error in list_servers: %s", e)
         return jsonify({"message": f"Error: {str(e)}", "status": "failure"}), 500
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5004, debug=True)
+    if SUPERVISE:
+        start_supervisor()
+    # The reloader would re-import this module and spawn every backend twice
+    app.run(host="0.0.0.0", port=5004, debug=True, use_reloader=not SUPERVISE)
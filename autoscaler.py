@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import deque
+
+
+class RequestMetrics:
+    """In-flight request count and a sliding window of upstream latencies"""
+
+    def __init__(self, window=30.0, max_samples=10000):
+
+        self.window = window
+        self.in_flight = 0
+        self.samples = deque(maxlen=max_samples)  # (timestamp, latency seconds)
+        self.lock = threading.Lock()
+
+    def begin(self):
+
+        with self.lock:
+            self.in_flight += 1
+
+    def end(self, latency):
+
+        with self.lock:
+            self.in_flight -= 1
+            self.samples.append((time.monotonic(), latency))
+
+    def p99(self, since=None, min_samples=0):
+        """p99 latency over the last `window` seconds (and after `since`, a
+        time.monotonic() timestamp), 0.0 when there was no traffic and None
+        when there are fewer than `min_samples` samples"""
+        cutoff = time.monotonic() - self.window
+        if since is not None:
+            cutoff = max(cutoff, since)
+        with self.lock:
+            recent = sorted(latency for ts, latency in self.samples if ts >= cutoff)
+        if len(recent) < min_samples:
+            return None
+        if not recent:
+            return 0.0
+        return recent[min(len(recent) - 1, int(0.99 * len(recent)))]
+
+    def get_stats(self):
+
+        return {"in_flight": self.in_flight, "p99_ms": round(self.p99() * 1000, 3)}
+
+
+class Autoscaler:
+    """Decides when to grow or shrink the pool from in-flight requests and p99 latency.
+
+    Scales out by one when in-flight requests per server exceed
+    `target_in_flight` or p99 exceeds `p99_high`; scales in by one when both
+    are well below (half the target, `p99_low`). After any action, further
+    scale-outs wait `cooldown_out` seconds and scale-ins `cooldown_in`, and
+    p99 only counts requests served after the action, so latency from before
+    a scale-out cannot trigger another one. Until `min_samples` requests have
+    been served since then, p99 is ignored in both directions so a single
+    slow request cannot trigger an action.
+    """
+
+    def __init__(self, metrics, scale_out, scale_in, pool_size, min_servers=2, max_servers=6,
+                 target_in_flight=4.0, p99_high=0.5, p99_low=0.1,
+                 cooldown_out=10.0, cooldown_in=30.0, min_samples=50):
+
+        self.metrics = metrics
+        self.scale_out = scale_out  # callable(n) -> number of servers added
+        self.scale_in = scale_in  # callable(n) -> number of servers removed
+        self.pool_size = pool_size  # callable() -> current number of servers
+        self.min_servers = min_servers
+        self.max_servers = max_servers
+        self.target_in_flight = target_in_flight
+        self.p99_high = p99_high
+        self.p99_low = p99_low
+        self.cooldown_out = cooldown_out
+        self.cooldown_in = cooldown_in
+        self.min_samples = min_samples
+        self.last_action = float("-inf")
+
+    def decide(self, now=None):
+        """Returns: +1 to scale out, -1 to scale in, 0 to hold"""
+        now = time.monotonic() if now is None else now
+        size = self.pool_size()
+        if size < self.min_servers:
+            return 1
+        if size > self.max_servers:
+            return -1
+
+        per_server = self.metrics.in_flight / max(size, 1)
+        p99 = self.metrics.p99(since=self.last_action, min_samples=self.min_samples)
+        # Too few samples: decide on in-flight requests alone
+        latency_high = p99 is not None and p99 > self.p99_high
+        latency_low = p99 is None or p99 < self.p99_low
+        since_last = now - self.last_action
+        if (per_server > self.target_in_flight or latency_high) and size < self.max_servers:
+            return 1 if since_last >= self.cooldown_out else 0
+        if per_server < self.target_in_flight / 2 and latency_low and size > self.min_servers:
+            return -1 if since_last >= self.cooldown_in else 0
+        return 0
+
+    def tick(self):
+        """Run one scaling decision. Returns the change in pool size"""
+        decision = self.decide()
+        changed = 0
+        if decision > 0:
+            changed = self.scale_out(1)
+        elif decision < 0:
+            changed = -self.scale_in(1)
+        if changed:
+            self.last_action = time.monotonic()
+        return changed
@@ -0,0 +1,73 @@
+import argparse
+import random
+import statistics
+import time
+from collections import Counter
+
+from hash import HASH_ENGINES
+
+
+def build_engine(name, num_servers):
+    """Build an engine with Server_1..Server_n"""
+    return HASH_ENGINES[name](num_servers=num_servers)
+
+
+def measure_lookup_speed(engine, keys):
+    """Lookups per second over the given keys"""
+    get_server = engine.get_server
+    start = time.perf_counter()
+    for key in keys:
+        get_server(key)
+    return len(keys) / (time.perf_counter() - start)
+
+
+def measure_balance(engine, keys):
+    """Max/mean load ratio and relative std dev of keys per server"""
+    counts = Counter(engine.get_server(key) for key in keys)
+    loads = list(counts.values())
+    mean = len(keys) / len(engine.get_server_distribution())
+    return max(loads) / mean, statistics.pstdev(loads) / mean
+
+
+def measure_disruption(name, num_servers, keys):
+    """Fraction of keys that change owner when one server is added / removed"""
+    engine = build_engine(name, num_servers)
+    before = [engine.get_server(key) for key in keys]
+
+    engine._add_server(f"Server_{num_servers + 1}")
+    after_add = [engine.get_server(key) for key in keys]
+
+    engine.remove_server(f"Server_{num_servers + 1}")
+    engine.remove_server("Server_1")
+    after_remove = [engine.get_server(key) for key in keys]
+
+    moved_add = sum(a != b for a, b in zip(before, after_add)) / len(keys)
+    moved_remove = sum(a != b for a, b in zip(before, after_remove)) / len(keys)
+    return moved_add, moved_remove
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare lookup engines from hash.py")
+    parser.add_argument("--keys", type=int, default=100000)
+    parser.add_argument("--servers", type=int, nargs="+", default=[3, 6, 12])
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    keys = [rng.randint(100000, 999999) for _ in range(args.keys)]
+
+    print(f"{args.keys} request ids per run; ideal disruption is 1/(N+1) on add and 1/N on remove\n")
+    print(f"{'engine':<8}{'N':>4}{'lookups/s':>12}{'max/mean':>10}{'rel std':>9}"
+          f"{'moved on add':>14}{'moved on rm':>13}")
+    for n in args.servers:
+        for name in HASH_ENGINES:
+            engine = build_engine(name, n)
+            speed = measure_lookup_speed(engine, keys)
+            peak, spread = measure_balance(engine, keys)
+            moved_add, moved_remove = measure_disruption(name, n, keys)
+            print(f"{name:<8}{n:>4}{speed:>12.0f}{peak:>10.2f}{spread:>9.3f}"
+                  f"{moved_add:>14.3f}{moved_remove:>13.3f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server", "server.py")
+
+
+def script_at_ref(ref):
+    """Write server/server.py as of git `ref` to a temp file and return its path.
+
+    Raises: RuntimeError when git is unavailable or the ref has no server/server.py
+    """
+    repo = os.path.dirname(os.path.abspath(__file__))
+    try:
+        source = subprocess.run(
+            ["git", "show", f"{ref}:server/server.py"], cwd=repo,
+            capture_output=True, check=True,
+        ).stdout
+    except OSError as e:
+        raise RuntimeError(f"Cannot run git to read {ref}:server/server.py: {e}")
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(
+            f"Cannot read {ref}:server/server.py: {e.stderr.decode(errors='replace').strip()}"
+        )
+    with tempfile.NamedTemporaryFile("wb", suffix="_server.py", delete=False) as f:
+        f.write(source)
+    return f.name
+
+
+def wait_for_server(port, timeout=15):
+    """Poll /heartbeat until the server answers or the timeout expires"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/heartbeat")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def run_load(port, path, duration, concurrency):
+    """Hammer the server from `concurrency` keep-alive clients, return requests/sec"""
+    counts = [0] * concurrency
+    stop_at = time.time() + duration
+
+    def client(idx):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        while time.time() < stop_at:
+            try:
+                conn.request("GET", path)
+                response = conn.getresponse()
+                response.read()
+                if response.status == 200:
+                    counts[idx] += 1
+                if response.getheader("Connection", "").lower() == "close" or response.version == 10:
+                    conn.close()
+                    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts) / (time.time() - start)
+
+
+def benchmark_mode(script, mode, port, workers, duration, concurrency):
+    """Start the server in `mode`, measure /home and /heartbeat throughput"""
+    env = dict(os.environ, SERVER_ID="bench", PORT=str(port), SERVER_MODE=mode, WORKERS=str(workers))
+    proc = subprocess.Popen(
+        [sys.executable, script], env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+    )
+    try:
+        if not wait_for_server(port):
+            raise RuntimeError(f"Server in {mode} mode did not start on port {port}")
+        results = {}
+        for path in ("/home", "/heartbeat"):
+            results[path] = run_load(port, path, duration, concurrency)
+        return results
+    finally:
+        # Kill the whole session so reloader children and workers go too
+        os.killpg(proc.pid, 15)
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Requests/sec per core for server/server.py")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--port", type=int, default=5900)
+    # The 'before' server must be named explicitly; guessing a commit from
+    # history silently benchmarks the wrong code
+    before = parser.add_mutually_exclusive_group(required=True)
+    before.add_argument("--before-ref",
+                        help="Git ref whose server/server.py is the 'before' server, e.g. a release tag")
+    before.add_argument("--before-script", help="Path of the 'before' server script")
+    args = parser.parse_args()
+
+    before_script = args.before_script
+    if args.before_ref:
+        try:
+            before_script = script_at_ref(args.before_ref)
+        except RuntimeError as e:
+            parser.error(str(e))
+
+    cores = os.cpu_count() or 1
+    print(f"Benchmarking with {cores} core(s), {args.concurrency} clients, {args.duration}s per endpoint")
+    print(f"before: {args.before_ref or before_script} (debug mode)")
+    print(f"after:  {SERVER_SCRIPT} (production mode, {args.workers} worker(s))")
+    try:
+        before = benchmark_mode(before_script, "debug", args.port, 1, args.duration, args.concurrency)
+    finally:
+        if args.before_ref:
+            os.remove(before_script)
+    after = benchmark_mode(SERVER_SCRIPT, "production", args.port + 1, args.workers, args.duration, args.concurrency)
+
+    print(f"{'endpoint':<12}{'before req/s/core':>20}{'after req/s/core':>24}{'speedup':>10}")
+    for path in before:
+        b, a = before[path] / cores, after[path] / cores
+        print(f"{path:<12}{b:>20.1f}{a:>24.1f}{a / b if b else 0:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
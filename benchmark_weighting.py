@@ -0,0 +1,92 @@
+import argparse
+import random
+
+from hash import HASH_ENGINES
+from weighting import LatencyWeighter
+
+
+def build_engine(name, num_servers):
+    return HASH_ENGINES[name](num_servers=num_servers)
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def simulate(engine_name, num_servers, degraded_factor, weighted, epochs, requests_per_epoch,
+             utilization, seed=7):
+    """Simulate traffic against M/M/1 backends where Server_1 is slowed down.
+
+    Each epoch routes requests_per_epoch random keys through the engine; a
+    backend's latency is drawn from Exp(mu - lambda) for its share of load.
+    Returns the latencies of the second half of the run (after warm-up).
+    """
+    rng = random.Random(seed)
+    engine = build_engine(engine_name, num_servers)
+    weighter = LatencyWeighter(interval=0)
+    # Healthy backends serve 100 req/s (10ms mean service time)
+    capacity = {f"Server_{i}": 100.0 for i in range(1, num_servers + 1)}
+    capacity["Server_1"] /= degraded_factor
+    # Offered load puts the busiest backend under unweighted routing at
+    # `utilization` of a healthy server's capacity; engines with skewed shares
+    # (the ring) would otherwise time out everywhere with or without weighting
+    sample = [rng.randint(100000, 999999) for _ in range(requests_per_epoch)]
+    shares = {}
+    for owner in (engine.get_server(key) for key in sample):
+        shares[owner] = shares.get(owner, 0) + 1
+    total_rate = utilization * 100.0 * len(sample) / max(shares.values())
+
+    latencies = []
+    for epoch in range(epochs):
+        keys = [rng.randint(100000, 999999) for _ in range(requests_per_epoch)]
+        owners = [engine.get_server(key) for key in keys]
+        counts = {}
+        for owner in owners:
+            counts[owner] = counts.get(owner, 0) + 1
+
+        epoch_latencies = []
+        for owner in owners:
+            arrival = total_rate * counts[owner] / requests_per_epoch
+            headroom = capacity[owner] - arrival
+            # An overloaded backend is capped at a 2s timeout, like route_home
+            latency = 2.0 if headroom <= 0 else min(2.0, rng.expovariate(headroom))
+            weighter.observe(owner, latency)
+            epoch_latencies.append(latency)
+
+        if weighted:
+            weighter.rebalance(engine, force=True)
+        if epoch >= epochs // 2:
+            latencies.extend(epoch_latencies)
+    return latencies, weighter.weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description="p99 with and without latency-aware weighting")
+    parser.add_argument("--servers", type=int, default=4)
+    parser.add_argument("--degraded-factor", type=float, default=1.5,
+                        help="Server_1 runs this many times slower than the others")
+    parser.add_argument("--utilization", type=float, default=0.6,
+                        help="Load on the busiest backend without weighting, relative to a healthy one's capacity")
+    parser.add_argument("--epochs", type=int, default=40)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"N={args.servers}, Server_1 {args.degraded_factor}x slower, "
+          f"busiest backend at {args.utilization:.0%} load, {args.epochs} epochs\n")
+    print(f"{'engine':<8}{'weighting':>10}{'p50 (s)':>10}{'p99 (s)':>10}  final weights")
+    for engine_name, engine_class in HASH_ENGINES.items():
+        if not engine_class.SUPPORTS_WEIGHTS:
+            continue
+        for weighted in (False, True):
+            latencies, weights = simulate(
+                engine_name, args.servers, args.degraded_factor, weighted,
+                args.epochs, args.requests, args.utilization,
+            )
+            shown = {name: round(w, 2) for name, w in sorted(weights.items())}
+            print(f"{engine_name:<8}{'on' if weighted else 'off':>10}"
+                  f"{percentile(latencies, 50):>10.3f}{percentile(latencies, 99):>10.3f}  {shown}")
+
+
+if __name__ == "__main__":
+    main()
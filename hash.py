@@ -1,10 +1,21 @@
+import bisect
+import hashlib
+import logging
 import math
 
+logger = logging.getLogger(__name__)
+
 class ConsistentHash:
+    SUPPORTS_WEIGHTS = True
+
     def __init__(self, num_servers=3, total_slots=512):
 
         self.total_slots = total_slots
-        self.virtual_servers = {}  # Dictionary mapping {slot: server_name}
+        # (virtual_servers, (sorted slots, distinct successors per slot)); the ring
+        # is copy-on-write and both halves are published in one assignment, so
+        # lookups on other threads always see a matching dict and index
+        self._ring = ({}, ([], []))
+        self.weights = {}  # server name -> lookup-time weight (default 1.0); copy-on-write
         
         # Add initial servers with virtual copies
         # This creates Server_1, Server_2, Server_3, etc.
@@ -16,9 +27,10 @@ class ConsistentHash:
         try:
             server_id = int(server_name.split('_')[1])
         except (IndexError, ValueError):
-            print(f"Warning: Invalid server name format: {server_name}")
+            logger.warning("Invalid server name format: %s", server_name)
             return False
         
+        ring = dict(self.virtual_servers)
         # Create K=9 virtual copies of this server
         for j in range(1, 10):  # j goes from 1 to 9
             # Calculate slot using virtual server hash function
@@ -28,19 +40,33 @@ class ConsistentHash:
             # If slot is already occupied, try slot + j², then slot + 2j², etc.
             original_slot = slot
             probe_count = 0
-            while slot in self.virtual_servers and probe_count < self.total_slots:
+            while slot in ring and probe_count < self.total_slots:
                 slot = (original_slot + j * j * (probe_count + 1)) % self.total_slots
                 probe_count += 1
             
             # If we couldn't find an empty slot, skip this virtual server
-            if slot in self.virtual_servers:
-                print(f"Warning: Could not place virtual server {server_name}_{j}")
+            if slot in ring:
+                logger.warning("Could not place virtual server %s_%d", server_name, j)
                 continue
             
             # Place the virtual server in the slot
-            self.virtual_servers[slot] = server_name
+            ring[slot] = server_name
+        self._publish(ring)
+        
+        logger.info("Added server %s with %d virtual copies", server_name,
+                    len([s for s in ring.values() if s == server_name]))
+        return True
+    
+    def set_weight(self, server_name, weight):
+        """Set a lookup-time weight: a key whose owner is lighter than its next
+        distinct successor moves to that successor with probability
+        1 - weight(owner) / weight(successor). Virtual copies stay where they are,
+        since their count barely changes a server's share (i² + 3j + 25 places
+        them on neighbouring slots)"""
+        if weight <= 0 or server_name not in self.virtual_servers.values():
+            return False
         
-        print(f"Added server {server_name} with {len([s for s in self.virtual_servers.values() if s == server_name])} virtual copies")
+        self.weights = dict(self.weights, **{server_name: weight})
         return True
     
     def _hash_virtual(self, i, j):
@@ -49,11 +75,20 @@ class ConsistentHash:
     
     def _hash_request(self, request_id):
 
+        # Non-integer routing keys are first reduced to a stable 64-bit integer
+        if not isinstance(request_id, int):
+            request_id = _hash_key(request_id)
         return (request_id * request_id + 2 * request_id + 17) % self.total_slots
     
     def get_server(self, request_id):
 
-        if not self.virtual_servers:
+        if self.weights:
+            # Weighted owners come from the replica index, see _shed
+            servers = self.get_servers(request_id, 1)
+            return servers[0] if servers else None
+        
+        virtual_servers = self.virtual_servers
+        if not virtual_servers:
             return None
         
         # Get the slot for this request
@@ -62,13 +97,90 @@ class ConsistentHash:
         # Find next available server (clockwise search)
         # This ensures consistent mapping even when servers are added/removed
         original_slot = slot
-        while slot not in self.virtual_servers:
+        while slot not in virtual_servers:
             slot = (slot + 1) % self.total_slots
             # Prevent infinite loop if no servers exist
             if slot == original_slot:
                 return None
         
-        return self.virtual_servers[slot]
+        return virtual_servers[slot]
+    
+    @property
+    def virtual_servers(self):
+        """Dictionary mapping {slot: server_name}; treat as read-only"""
+        return self._ring[0]
+    
+    @virtual_servers.setter
+    def virtual_servers(self, ring):
+        self._publish(dict(ring))
+    
+    def _publish(self, ring):
+        """Build the replica index for a new ring and swap both in at once"""
+        self._ring = (ring, self._build_replicas(ring))
+    
+    def _build_replicas(self, ring):
+
+        slots = sorted(ring)
+        owners = [ring[slot] for slot in slots]
+        
+        # Walk the ring backwards twice (to cover the wrap-around); the distinct
+        # successors of position i are its owner followed by those of i + 1
+        replicas = [None] * len(slots)
+        successors = ()
+        for i in range(2 * len(slots) - 1, -1, -1):
+            owner = owners[i % len(slots)]
+            successors = (owner,) + tuple(s for s in successors if s != owner)
+            if i < len(slots):
+                replicas[i] = successors
+        
+        return slots, replicas
+    
+    def _shed(self, request_id, owners, weights):
+        """Swap the first two owners for the fraction of keys the first one sheds.
+
+        The choice is a deterministic function of the key, so a key keeps its
+        server for as long as the weights stay the same.
+        """
+        if len(owners) < 2:
+            return owners
+        first, second = owners[0], owners[1]
+        keep = weights.get(first, 1.0) / weights.get(second, 1.0)
+        if keep >= 1.0 or (_hash_key(request_id) >> 11) / (1 << 53) < keep:
+            return owners
+        return (second, first) + owners[2:]
+    
+    def get_servers(self, request_id, r):
+        """Returns: first r distinct servers clockwise from the request's slot"""
+        slots, replicas = self._ring[1]
+        weights = self.weights
+        if not slots:
+            return []
+        
+        # First virtual server at or after the slot, same as get_server
+        i = bisect.bisect_left(slots, self._hash_request(request_id))
+        owners = replicas[i if i < len(slots) else 0]
+        if weights:
+            owners = self._shed(request_id, owners, weights)
+        return list(owners[:r])
+    
+    def get_servers_batch(self, request_ids, r):
+        """Returns: list of get_servers(request_id, r) for each request id"""
+        slots, replicas = self._ring[1]
+        weights = self.weights
+        if not slots:
+            return [[] for _ in request_ids]
+        
+        num_slots = len(slots)
+        hash_request = self._hash_request
+        bisect_left = bisect.bisect_left
+        result = []
+        for request_id in request_ids:
+            i = bisect_left(slots, hash_request(request_id))
+            owners = replicas[i if i < num_slots else 0]
+            if weights:
+                owners = self._shed(request_id, owners, weights)
+            result.append(list(owners[:r]))
+        return result
     
     def remove_server(self, server_name):
 
@@ -81,16 +193,21 @@ class ConsistentHash:
             if server == server_name:
                 slots_to_remove.append(slot)
         
-        # Remove all the slots
-        for slot in slots_to_remove:
-            del self.virtual_servers[slot]
-        
+        # Remove all the slots from a copy and publish it with its index
         removed_count = len(slots_to_remove)
         if removed_count > 0:
-            print(f"Removed {removed_count} virtual copies of {server_name}")
+            ring = dict(self.virtual_servers)
+            for slot in slots_to_remove:
+                del ring[slot]
+            self._publish(ring)
+            if server_name in self.weights:
+                weights = dict(self.weights)
+                del weights[server_name]
+                self.weights = weights
+            logger.info("Removed %d virtual copies of %s", removed_count, server_name)
             return True
         else:
-            print(f"Server {server_name} not found in hash ring")
+            logger.warning("Server %s not found in hash ring", server_name)
             return False
     
     # Alias for compatibility with load balancer
@@ -106,4 +223,280 @@ class ConsistentHash:
         for server in self.virtual_servers.values():
             distribution[server] = distribution.get(server, 0) + 1
         return distribution
+
+
+MASK64 = (1 << 64) - 1
+
+
+def _mix64(x):
+    """splitmix64 finalizer: spreads integer request ids over 64 bits"""
+    x = (x + 0x9E3779B97F4A7C15) & MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+
+def _hash_name(name, seed=0):
+    """Stable 64-bit hash of a server name (Python's hash() is salted per process)"""
+    digest = hashlib.blake2b(name.encode(), digest_size=8, salt=seed.to_bytes(8, "little"))
+    return int.from_bytes(digest.digest(), "little")
+
+
+def _hash_key(key):
+    """64-bit hash for a request id (int) or any other routing key"""
+    if isinstance(key, int):
+        return _mix64(key & MASK64)
+    return _hash_name(str(key))
+
+
+class MaglevHash:
+    """Maglev lookup table: each server fills the table by walking its own
+    permutation of slots, giving O(1) lookups and near-equal shares.
+
+    table_size should be a prime much larger than the number of servers.
+    """
+
+    SUPPORTS_WEIGHTS = True
+
+    def __init__(self, num_servers=3, table_size=65537):
+
+        self.table_size = table_size
+        self.weights = {}  # server name -> relative weight (default 1.0); copy-on-write
+        # (server names in insertion order, lookup[slot] -> server name); both are
+        # rebuilt off to the side and published in one assignment, so lookups on
+        # other threads never see a server list that does not match the table
+        self._table = ([], [])
+        
+        for server_id in range(1, num_servers + 1):
+            self._add_server(f"Server_{server_id}")
+    
+    def _permutation(self, server_name):
+
+        # Each server gets its own (offset, skip) pair; skip is non-zero so the
+        # walk offset, offset+skip, ... visits every slot of the prime table
+        offset = _hash_name(server_name, seed=1) % self.table_size
+        skip = _hash_name(server_name, seed=2) % (self.table_size - 1) + 1
+        return offset, skip
+    
+    @property
+    def servers(self):
+        """Server names in insertion order; treat as read-only"""
+        return self._table[0]
+    
+    @servers.setter
+    def servers(self, servers):
+        self._table = (list(servers), self._table[1])
+    
+    @property
+    def lookup(self):
+        """lookup[slot] -> server name; treat as read-only"""
+        return self._table[1]
+    
+    @lookup.setter
+    def lookup(self, lookup):
+        self._table = (self._table[0], list(lookup))
     
+    def _publish(self, servers, weights):
+        """Build the table for a new server list and swap both in at once"""
+        lookup = self._populate(servers, weights)
+        self.weights = weights
+        self._table = (servers, lookup)
+    
+    def _populate(self, servers, weights):
+        """Returns: the lookup table for servers with the given weights"""
+        n = len(servers)
+        if n == 0:
+            return []
+        
+        M = self.table_size
+        positions = []
+        skips = []
+        for server_name in servers:
+            offset, skip = self._permutation(server_name)
+            positions.append(offset)
+            skips.append(skip)
+        
+        # Servers take turns claiming their next preferred free slot; a server
+        # with weight w relative to the heaviest one only claims on a w fraction of turns
+        max_weight = max(weights.get(s, 1.0) for s in servers)
+        shares = [weights.get(s, 1.0) / max_weight for s in servers]
+        credits = [0.0] * n
+        entry = [None] * M
+        filled = 0
+        while True:
+            for i in range(n):
+                credits[i] += shares[i]
+                if credits[i] < 1.0:
+                    continue
+                credits[i] -= 1.0
+                slot = positions[i]
+                while entry[slot] is not None:
+                    slot = (slot + skips[i]) % M
+                entry[slot] = servers[i]
+                positions[i] = (slot + skips[i]) % M
+                filled += 1
+                if filled == M:
+                    return entry
+    
+    def _add_server(self, server_name):
+
+        if not server_name or server_name in self.servers:
+            logger.warning("Invalid or duplicate server name: %s", server_name)
+            return False
+        
+        self._publish(self.servers + [server_name], self.weights)
+        logger.info("Added server %s to Maglev table of %d slots", server_name, self.table_size)
+        return True
+    
+    def get_server(self, request_id):
+
+        if not self.lookup:
+            return None
+        return self.lookup[_hash_key(request_id) % self.table_size]
+    
+    def get_servers(self, request_id, r):
+        """Returns: first r distinct servers found scanning the table forward from the key's slot"""
+        servers, lookup = self._table
+        if not lookup:
+            return []
+        
+        r = min(r, len(servers))
+        slot = _hash_key(request_id) % self.table_size
+        found = []
+        # Every server owns a slot, but bound the scan to one pass over the table anyway
+        for _ in range(self.table_size):
+            if len(found) >= r:
+                break
+            server = lookup[slot]
+            if server not in found:
+                found.append(server)
+            slot = (slot + 1) % self.table_size
+        return found
+    
+    def get_servers_batch(self, request_ids, r):
+        """Returns: list of get_servers(request_id, r) for each request id"""
+        return [self.get_servers(request_id, r) for request_id in request_ids]
+    
+    def remove_server(self, server_name):
+
+        if server_name not in self.servers:
+            logger.warning("Server %s not found in Maglev table", server_name)
+            return False
+        
+        weights = dict(self.weights)
+        weights.pop(server_name, None)
+        self._publish([s for s in self.servers if s != server_name], weights)
+        logger.info("Removed %s from Maglev table", server_name)
+        return True
+    
+    def set_weight(self, server_name, weight):
+        """Give a server a weight-proportional share of the lookup table"""
+        if server_name not in self.servers or weight <= 0:
+            return False
+        
+        self._publish(self.servers, dict(self.weights, **{server_name: weight}))
+        return True
+    
+    def get_server_for_request(self, request_id):
+        """Alias for get_server method for backward compatibility"""
+        return self.get_server(request_id)
+    
+    def get_server_distribution(self):
+        """Returns: Dictionary with server names as keys and lookup table slot counts as values"""
+        distribution = {}
+        for server in self.lookup:
+            distribution[server] = distribution.get(server, 0) + 1
+        return distribution
+
+
+def _jump_bucket(key, num_buckets):
+    """Jump consistent hash (Lamping & Veach): bucket in [0, num_buckets)"""
+    b, j = -1, 0
+    while j < num_buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & MASK64
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+class JumpHash:
+    """Jump consistent hash: no lookup table, O(log N) arithmetic per lookup.
+
+    Jump hash only supports removing the last bucket, so removing a server
+    moves the last server into its bucket; keys of those two servers move.
+    """
+
+    SUPPORTS_WEIGHTS = False
+
+    def __init__(self, num_servers=3):
+
+        self.servers = []  # servers[bucket] -> server name
+        
+        for server_id in range(1, num_servers + 1):
+            self._add_server(f"Server_{server_id}")
+    
+    def _add_server(self, server_name):
+
+        if not server_name or server_name in self.servers:
+            logger.warning("Invalid or duplicate server name: %s", server_name)
+            return False
+        
+        # Publish a new list rather than mutating the one lookups may be reading
+        self.servers = self.servers + [server_name]
+        logger.info("Added server %s as jump bucket %d", server_name, len(self.servers) - 1)
+        return True
+    
+    def get_server(self, request_id):
+
+        if not self.servers:
+            return None
+        return self.servers[_jump_bucket(_hash_key(request_id), len(self.servers))]
+    
+    def get_servers(self, request_id, r):
+        """Returns: the key's bucket owner followed by the next r - 1 buckets"""
+        servers = self.servers
+        if not servers:
+            return []
+        
+        bucket = _jump_bucket(_hash_key(request_id), len(servers))
+        return [servers[(bucket + i) % len(servers)] for i in range(min(r, len(servers)))]
+    
+    def get_servers_batch(self, request_ids, r):
+        """Returns: list of get_servers(request_id, r) for each request id"""
+        return [self.get_servers(request_id, r) for request_id in request_ids]
+    
+    def remove_server(self, server_name):
+
+        if server_name not in self.servers:
+            logger.warning("Server %s not found in jump buckets", server_name)
+            return False
+        
+        # Fill the freed bucket with the last server and drop the last bucket
+        servers = list(self.servers)
+        bucket = servers.index(server_name)
+        last = servers.pop()
+        if bucket < len(servers):
+            servers[bucket] = last
+        self.servers = servers
+        logger.info("Removed %s from jump buckets", server_name)
+        return True
+    
+    def set_weight(self, server_name, weight):
+        """Jump hash buckets are equal-sized, so weights are not supported"""
+        return False
+    
+    def get_server_for_request(self, request_id):
+        """Alias for get_server method for backward compatibility"""
+        return self.get_server(request_id)
+    
+    def get_server_distribution(self):
+        """Returns: Dictionary with server names as keys and bucket counts as values"""
+        return {server: 1 for server in self.servers}
+
+
+# Lookup engines selectable by name, all sharing the ConsistentHash interface
+HASH_ENGINES = {
+    "ring": ConsistentHash,
+    "maglev": MaglevHash,
+    "jump": JumpHash,
+}
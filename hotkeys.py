@@ -0,0 +1,140 @@
+import heapq
+import math
+import threading
+import time
+
+
+class SpaceSaving:
+    """Space-Saving heavy-hitters sketch with at most `capacity` counters.
+
+    A new key evicts the key with the smallest count and inherits that count
+    as its possible overestimate (error), so `count - error` is a guaranteed
+    lower bound on the key's true count.
+
+    The minimum is found through a lazily maintained min-heap with one entry
+    per key: increments leave the entry stale (too low) and it is only
+    refreshed when it reaches the top, so eviction is amortized O(log capacity).
+    """
+
+    def __init__(self, capacity=256):
+
+        self.capacity = capacity
+        self.counts = {}  # key -> estimated count
+        self.errors = {}  # key -> maximum overestimate of counts[key]
+        self.heap = []  # (count when pushed, key), at most counts[key]
+        self.total = 0.0
+
+    def offer(self, key):
+        """Count one occurrence of key. Returns the evicted key, if any"""
+        self.total += 1
+        if key in self.counts:
+            self.counts[key] += 1
+            return None
+
+        evicted = None
+        floor = 0.0
+        if len(self.counts) >= self.capacity:
+            evicted = self._pop_min()
+            floor = self.counts.pop(evicted)
+            self.errors.pop(evicted)
+        self.counts[key] = floor + 1
+        self.errors[key] = floor
+        heapq.heappush(self.heap, (floor + 1, key))
+        return evicted
+
+    def _pop_min(self):
+        """Remove and return the key with the smallest count from the heap"""
+        while True:
+            count, key = heapq.heappop(self.heap)
+            current = self.counts[key]
+            if count == current:
+                return key
+            # Stale entry: the key was incremented since it was pushed
+            heapq.heappush(self.heap, (current, key))
+
+    def guaranteed(self, key):
+
+        return self.counts.get(key, 0.0) - self.errors.get(key, 0.0)
+
+    def decay(self, factor=0.5):
+        """Scale all counts down so the sketch follows recent traffic"""
+        self.total *= factor
+        for key in list(self.counts):
+            self.counts[key] *= factor
+            self.errors[key] *= factor
+            if self.counts[key] < 1:
+                del self.counts[key]
+                del self.errors[key]
+        # Decay is rare, so rebuilding the heap is cheaper than tracking deletions
+        self.heap = [(count, key) for key, count in self.counts.items()]
+        heapq.heapify(self.heap)
+
+    def top(self, k):
+        """Returns: up to k (key, estimated count) pairs, largest first"""
+        return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+class HotKeyDetector:
+    """Marks routing keys as hot when they carry more than `hot_share` of recent
+    traffic and spreads them over several ring successors.
+
+    The spread factor is the number of servers needed to bring the key's share
+    per server down to a fair 1/N, bounded by [2, max_spread]. A hot key goes
+    back to a single owner once its share drops below `cool_share`; the gap
+    between the two thresholds keeps keys from flapping.
+    """
+
+    def __init__(self, capacity=256, hot_share=0.05, cool_share=0.02, min_count=50,
+                 max_spread=4, decay_interval=10.0):
+
+        self.sketch = SpaceSaving(capacity)
+        self.hot_share = hot_share
+        self.cool_share = cool_share
+        self.min_count = min_count
+        self.max_spread = max_spread
+        self.decay_interval = decay_interval
+        self.spread = {}  # hot key -> number of ring successors it is spread over
+        self.last_decay = time.monotonic()
+        self.lock = threading.Lock()
+
+    def record(self, key, num_servers):
+        """Count one request for key. Returns the number of replicas to spread it over"""
+        with self.lock:
+            now = time.monotonic()
+            if now - self.last_decay >= self.decay_interval:
+                self.sketch.decay()
+                self.last_decay = now
+                for hot_key in list(self.spread):
+                    if hot_key not in self.sketch.counts:
+                        del self.spread[hot_key]
+
+            evicted = self.sketch.offer(key)
+            if evicted is not None:
+                self.spread.pop(evicted, None)
+
+            count = self.sketch.guaranteed(key)
+            share = count / self.sketch.total
+            if key in self.spread:
+                if share < self.cool_share:
+                    del self.spread[key]
+                    return 1
+            elif count < self.min_count or share < self.hot_share:
+                return 1
+
+            spread = min(self.max_spread, num_servers, max(2, math.ceil(share * num_servers)))
+            self.spread[key] = spread
+            return spread
+
+    def get_stats(self, k=10):
+        """Returns: list of the top-k keys with their estimated count, share and spread"""
+        with self.lock:
+            total = self.sketch.total or 1.0
+            return [
+                {
+                    "key": key,
+                    "count": round(count, 1),
+                    "share": round(count / total, 4),
+                    "spread": self.spread.get(key, 1),
+                }
+                for key, count in self.sketch.top(k)
+            ]
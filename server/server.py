@@ -1,24 +1,133 @@
-from flask import Flask, jsonify
+from flask import Flask
+import itertools
+import json
+import logging
+import logging.handlers
 import os
+import queue
+import signal
+import socket
+from werkzeug.serving import WSGIRequestHandler, make_server
 
 app = Flask(__name__)
 server_id = os.getenv("SERVER_ID", "unknown")
 
+# Serving mode: "debug" keeps the Flask dev server with the reloader,
+# "production" runs pre-forked workers with no reloader and sampled logging
+SERVER_MODE = os.getenv("SERVER_MODE", "debug")
+WORKERS = int(os.getenv("WORKERS", os.cpu_count() or 1))
+# Log 1 in every LOG_SAMPLE_RATE requests (1 = log every request)
+LOG_SAMPLE_RATE = int(
+    os.getenv("LOG_SAMPLE_RATE", 1000 if SERVER_MODE == "production" else 1)
+)
+
+# Response bodies are encoded once at startup instead of on every request
+HOME_BODY = json.dumps(
+    {"message": f"Hello from Server: {server_id}", "server": server_id, "status": "successful"}
+).encode()
+HEARTBEAT_BODY = b""
+# The supervisor passes a per-spawn token and checks it on /heartbeat, so an
+# unrelated process already listening on the port is not mistaken for this one
+SPAWN_TOKEN = os.getenv("SPAWN_TOKEN", "")
+HEARTBEAT_HEADERS = {"X-Spawn-Token": SPAWN_TOKEN} if SPAWN_TOKEN else {}
+
+# Log records go through a queue so the request thread never waits on I/O
+log_queue = queue.SimpleQueue()
+log_listener = None
+request_counter = itertools.count()
+access_counter = itertools.count()
+
+
+def setup_logging():
+    """Route app.logger and werkzeug's request log through a QueueHandler
+    drained by a background thread"""
+    global log_listener
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(
+        logging.Formatter("[%(asctime)s] %(levelname)s in %(module)s: %(message)s")
+    )
+    # werkzeug adds its own StreamHandler when its logger has none, which
+    # would write every request line to stderr on the request thread
+    for logger in (app.logger, logging.getLogger("werkzeug")):
+        logger.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+        logger.setLevel("INFO")
+        logger.propagate = False
+    log_listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    log_listener.start()
+
+
+def log_sampled(msg, *args):
+    """Log only 1 in LOG_SAMPLE_RATE calls; formatting is deferred to the listener"""
+    if next(request_counter) % LOG_SAMPLE_RATE == 0:
+        app.logger.info(msg, *args)
+
+
+class SampledRequestHandler(WSGIRequestHandler):
+    """Emit werkzeug's per-request access line for 1 in LOG_SAMPLE_RATE requests"""
+
+    def log_request(self, code="-", size="-"):
+        if next(access_counter) % LOG_SAMPLE_RATE == 0:
+            super().log_request(code, size)
+
+
 @app.route('/home', methods=['GET'])
 def home():
-    app.logger.info(f"Received request at /home from {server_id}")
-    return jsonify({
-        "message": f"Hello from Server: {server_id}", 
-        "status": "successful"
-    }), 200
+    log_sampled("Received request at /home from %s", server_id)
+    return app.response_class(HOME_BODY, status=200, mimetype="application/json")
 
 @app.route('/heartbeat', methods=['GET'])
 def heartbeat():
-    app.logger.info("Heartbeat checked")
-    return '', 200
+    log_sampled("Heartbeat checked")
+    return app.response_class(HEARTBEAT_BODY, status=200, headers=HEARTBEAT_HEADERS)
+
+
+def serve_production(host, port, workers):
+    """Pre-fork `workers` processes that accept on one shared listening socket"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    sock.set_inheritable(True)
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            # Threads do not survive fork, so each worker starts its own listener
+            setup_logging()
+            server = make_server(
+                host, port, app, threaded=True,
+                request_handler=SampledRequestHandler, fd=sock.fileno(),
+            )
+            try:
+                server.serve_forever()
+            finally:
+                log_listener.stop()
+                os._exit(0)
+        children.append(pid)
+
+    def shutdown(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    for pid in children:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    sock.close()
+
 
 if __name__ == '__main__':
     port = int(os.getenv("PORT", 5000))
-    app.logger.setLevel('INFO')
-    print(f"Starting server {server_id} on port {port}")
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    print(f"Starting server {server_id} on port {port} ({SERVER_MODE} mode)")
+    if SERVER_MODE == "production":
+        serve_production('0.0.0.0', port, WORKERS)
+    else:
+        setup_logging()
+        app.run(host='0.0.0.0', port=port, debug=True, request_handler=SampledRequestHandler)
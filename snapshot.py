@@ -0,0 +1,141 @@
+import array
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+from hash import ConsistentHash, JumpHash, MaglevHash
+
+# File layout (little-endian):
+#   header   magic, version, engine code, member count, entry count, size, crc32
+#   members  per member: uint16 length + UTF-8 "Server_n:port"
+#   slots    uint32 per entry (ring engine only: slot number of each virtual server)
+#   owners   uint16 per entry: index into members of the slot/table/bucket owner
+#   weights  float64 per member: latency weight applied to the engine (1.0 = default)
+# crc32 covers everything after the header, so torn or corrupt files are rejected.
+MAGIC = b"LBSN"
+VERSION = 2
+HEADER = struct.Struct("<4sBBHIII")
+ENGINE_CODES = {"ring": 0, "maglev": 1, "jump": 2}
+ENGINE_NAMES = {code: name for name, code in ENGINE_CODES.items()}
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is missing, corrupt or unsupported"""
+
+
+def _le_array(typecode, values=()):
+    arr = array.array(typecode, values)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr
+
+
+def _ring_entries(engine_name, hash_ring):
+    """Returns (size, slots, owner names) describing the engine's routing state"""
+    if engine_name == "ring":
+        slots = sorted(hash_ring.virtual_servers)
+        return hash_ring.total_slots, slots, [hash_ring.virtual_servers[s] for s in slots]
+    if engine_name == "maglev":
+        return hash_ring.table_size, [], hash_ring.lookup
+    if engine_name == "jump":
+        return 0, [], hash_ring.servers
+    raise SnapshotError(f"Unknown hash engine: {engine_name}")
+
+
+def save_snapshot(path, engine_name, servers, hash_ring):
+    """Atomically write membership and ring state to path (write temp file, fsync, rename)
+
+    Raises: SnapshotError when the state cannot be encoded, OSError when it cannot be written
+    """
+    size, slots, owners = _ring_entries(engine_name, hash_ring)
+    index = {server.split(":")[0]: i for i, server in enumerate(servers)}
+
+    try:
+        payload = bytearray()
+        for server in servers:
+            encoded = server.encode()
+            payload += struct.pack("<H", len(encoded)) + encoded
+        payload += _le_array("I", slots).tobytes()
+        payload += _le_array("H", (index[name] for name in owners)).tobytes()
+        weights = getattr(hash_ring, "weights", {})
+        payload += _le_array("d", (weights.get(name, 1.0) for name in index)).tobytes()
+
+        header = HEADER.pack(
+            MAGIC, VERSION, ENGINE_CODES[engine_name], len(servers), len(owners), size,
+            zlib.crc32(payload),
+        )
+    except KeyError as e:
+        raise SnapshotError(f"Ring owner {e} is not in the server list")
+    except (struct.error, OverflowError) as e:
+        raise SnapshotError(f"State does not fit the snapshot format: {e}")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path):
+    """Memory-map a snapshot and rebuild the exact routing state it describes.
+
+    Returns:(engine name, servers list, hash ring, {server name: weight} for non-default weights)
+    """
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _parse(mm)
+    except (OSError, ValueError, struct.error) as e:
+        raise SnapshotError(f"Cannot read snapshot {path}: {e}") from e
+
+
+def _parse(mm):
+    magic, version, engine_code, num_members, num_entries, size, crc = HEADER.unpack_from(mm, 0)
+    if magic != MAGIC or version != VERSION or engine_code not in ENGINE_NAMES:
+        raise SnapshotError("Unsupported snapshot format")
+    if zlib.crc32(mm[HEADER.size:]) != crc:
+        raise SnapshotError("Snapshot checksum mismatch")
+
+    offset = HEADER.size
+    servers = []
+    for _ in range(num_members):
+        (length,) = struct.unpack_from("<H", mm, offset)
+        offset += 2
+        servers.append(mm[offset:offset + length].decode())
+        offset += length
+    names = [server.split(":")[0] for server in servers]
+
+    engine_name = ENGINE_NAMES[engine_code]
+    slots = _le_array("I")
+    if engine_name == "ring":
+        slots.frombytes(mm[offset:offset + 4 * num_entries])
+        offset += 4 * num_entries
+    owners = _le_array("H")
+    owners.frombytes(mm[offset:offset + 2 * num_entries])
+    offset += 2 * num_entries
+    member_weights = _le_array("d")
+    member_weights.frombytes(mm[offset:offset + 8 * num_members])
+    if sys.byteorder == "big":
+        slots.byteswap()
+        owners.byteswap()
+        member_weights.byteswap()
+    owner_names = [names[i] for i in owners]
+    weights = {name: w for name, w in zip(names, member_weights) if w != 1.0}
+
+    # Engines are built empty and their state assigned directly, so the
+    # restored routing is byte-for-byte what was saved
+    if engine_name == "ring":
+        hash_ring = ConsistentHash(num_servers=0, total_slots=size)
+        hash_ring.virtual_servers = dict(zip(slots, owner_names))
+        hash_ring.weights = dict(weights)
+    elif engine_name == "maglev":
+        hash_ring = MaglevHash(num_servers=0, table_size=size)
+        hash_ring.servers = names
+        hash_ring.weights = dict(weights)
+        hash_ring.lookup = owner_names
+    else:
+        hash_ring = JumpHash(num_servers=0)
+        hash_ring.servers = owner_names
+    return engine_name, servers, hash_ring, weights
@@ -0,0 +1,124 @@
+import logging
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server", "server.py")
+
+
+class ServerSupervisor:
+    """Spawns and reaps local server/server.py processes, one per "Server_n:port" entry"""
+
+    def __init__(self, server_mode="production", workers=1, start_timeout=10.0):
+
+        self.server_mode = server_mode
+        self.workers = workers
+        self.start_timeout = start_timeout
+        self.processes = {}  # "Server_n:port" -> subprocess.Popen
+        self.lock = threading.Lock()
+
+    def _wait_until_alive(self, port, proc, token):
+        """True once /heartbeat on port answers with this spawn's token.
+
+        A process that was already on the port (e.g. a backend orphaned by a
+        crashed balancer) answers without the token, and a child that exits
+        during startup, typically with EADDRINUSE, is a failure.
+        """
+        deadline = time.monotonic() + self.start_timeout
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                return False
+            try:
+                response = requests.get(f"http://localhost:{port}/heartbeat", timeout=0.5)
+                if response.status_code == 200 and response.headers.get("X-Spawn-Token") == token:
+                    # The token may come from a worker that outlives a failed parent
+                    return proc.poll() is None
+            except requests.RequestException:
+                pass
+            time.sleep(0.1)
+        return False
+
+    def spawn(self, server):
+        """Start a backend for `server` and wait for its heartbeat. Returns True when it is up"""
+        server_name, port = server.split(":")
+        with self.lock:
+            proc = self.processes.get(server)
+            if proc is not None and proc.poll() is None:
+                return True
+
+        token = secrets.token_hex(8)
+        env = dict(
+            os.environ, SERVER_ID=server_name, PORT=port,
+            SERVER_MODE=self.server_mode, WORKERS=str(self.workers), SPAWN_TOKEN=token,
+        )
+        # New session so reaping can signal the server and all of its workers
+        proc = subprocess.Popen(
+            [sys.executable, SERVER_SCRIPT], env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+        )
+        if not self._wait_until_alive(port, proc, token):
+            logger.error("Server %s did not become healthy, reaping it", server)
+            self._stop(proc)
+            return False
+
+        with self.lock:
+            self.processes[server] = proc
+        logger.info("Spawned %s (pid %s)", server, proc.pid)
+        return True
+
+    def _stop(self, proc):
+
+        try:
+            os.killpg(proc.pid, signal.SIGTERM)
+            proc.wait(timeout=5)
+        except ProcessLookupError:
+            pass
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.wait()
+
+    def reap(self, server):
+        """Stop the backend for `server`. Returns False when it was not supervised"""
+        with self.lock:
+            proc = self.processes.pop(server, None)
+        if proc is None:
+            return False
+        self._stop(proc)
+        logger.info("Reaped %s (exit code %s)", server, proc.returncode)
+        return True
+
+    def respawn_dead(self):
+        """Restart supervised backends that exited on their own. Returns the restarted servers
+
+        Callers must not run reap() concurrently (app.py holds its membership
+        lock), otherwise a server removed mid-respawn would be started again.
+        """
+        with self.lock:
+            dead = [server for server, proc in self.processes.items() if proc.poll() is not None]
+        restarted = []
+        for server in dead:
+            logger.warning("Server %s exited, respawning", server)
+            with self.lock:
+                proc = self.processes.pop(server, None)
+            # Workers of a dead server process can outlive it and keep the port;
+            # stop the whole process group before starting a replacement
+            if proc is not None:
+                self._stop(proc)
+            if self.spawn(server):
+                restarted.append(server)
+        return restarted
+
+    def reap_all(self):
+
+        with self.lock:
+            supervised = list(self.processes)
+        for server in supervised:
+            self.reap(server)
@@ -0,0 +1,103 @@
+import math
+import threading
+import time
+
+
+class LatencyWeighter:
+    """Tracks an EWMA of upstream latency per server and nudges ring weights.
+
+    Slow servers get their weight cut, fast ones get it raised, within
+    [min_weight, max_weight]. Each step also pulls the weight back towards
+    1.0 by `decay`, so a weight settles at (median / latency) ** (gain / decay)
+    instead of accumulating noise. A weight only changes when the target differs
+    from the current weight by more than `hysteresis` (relative), and at most
+    once per `interval` seconds, so the ring does not thrash.
+    """
+
+    def __init__(self, alpha=0.05, min_weight=0.25, max_weight=2.0,
+                 hysteresis=0.2, gain=0.5, decay=0.5, interval=5.0):
+
+        self.alpha = alpha
+        self.min_weight = min_weight
+        self.max_weight = max_weight
+        self.hysteresis = hysteresis
+        self.gain = gain
+        self.decay = decay
+        self.interval = interval
+        self.ewma = {}  # server name -> EWMA latency in seconds
+        self.weights = {}  # server name -> weight currently applied to the ring
+        self.last_rebalance = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, server_name, latency):
+
+        with self.lock:
+            previous = self.ewma.get(server_name)
+            if previous is None:
+                self.ewma[server_name] = latency
+            else:
+                self.ewma[server_name] = previous + self.alpha * (latency - previous)
+
+    def forget(self, server_name):
+        """Drop state for a server that left the ring"""
+        with self.lock:
+            self.ewma.pop(server_name, None)
+            self.weights.pop(server_name, None)
+
+    def target_weights(self):
+        """Returns: Dictionary of server name -> proposed weight"""
+        with self.lock:
+            ewma = dict(self.ewma)
+        if len(ewma) < 2:
+            return {}
+
+        # Compare each server with the median so one slow server cannot drag
+        # the reference point; the gain < 1 damps each step, and without the
+        # decay towards 1.0 servers of equal speed would drift apart on noise
+        latencies = sorted(ewma.values())
+        median = latencies[len(latencies) // 2]
+        raw = {}
+        for server_name, latency in ewma.items():
+            if latency <= 0:
+                continue
+            current = self.weights.get(server_name, 1.0)
+            raw[server_name] = current ** (1 - self.decay) * (median / latency) ** self.gain
+
+        # Renormalize to a mean of 1 so weights do not drift towards the bounds
+        scale = len(raw) / sum(raw.values())
+        return {
+            server_name: min(self.max_weight, max(self.min_weight, target * scale))
+            for server_name, target in raw.items()
+        }
+
+    def rebalance(self, hash_ring, force=False):
+        """Apply weight changes that clear the hysteresis band.
+
+        Returns: Dictionary of server name -> new weight for servers that changed
+        """
+        now = time.monotonic()
+        if not force and now - self.last_rebalance < self.interval:
+            return {}
+        self.last_rebalance = now
+
+        threshold = math.log1p(self.hysteresis)
+        changed = {}
+        for server_name, target in self.target_weights().items():
+            current = self.weights.get(server_name, 1.0)
+            if abs(math.log(target / current)) < threshold:
+                continue
+            if hash_ring.set_weight(server_name, target):
+                self.weights[server_name] = target
+                changed[server_name] = target
+        return changed
+
+    def get_stats(self):
+        """Returns: Dictionary of server name -> {ewma_ms, weight}"""
+        with self.lock:
+            return {
+                server_name: {
+                    "ewma_ms": round(latency * 1000, 3),
+                    "weight": round(self.weights.get(server_name, 1.0), 3),
+                }
+                for server_name, latency in self.ewma.items()
+            }